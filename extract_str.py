@@ -4,33 +4,372 @@ STR PDF Data Extractor - Production script
 Extracts data from STR PDFs using bounding box template
 """
 
+import io
+import itertools
 import json
+import logging
+import mmap
+import os
+import queue
+import re
 import sys
 import csv
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
+import numpy as np
 import pdfplumber
 
+try:
+    import orjson  # Optional: faster template loading and JSON output
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Text clean-up patterns for extracted box text
+WHITESPACE_RE = re.compile(r'\s+')
+TRAILING_PUNCT_RE = re.compile(r'[:;,.]+$')
+
+# Field box coordinates and word reading-order sort key
+BOX_COORDS = itemgetter('x', 'y', 'width', 'height')
+WORD_POSITION = itemgetter('top', 'x0')
+
+
+def compile_label_pattern(field_labels):
+    """Compile {field_key: label} into one alternation with a named group per field
+
+    Patterns match uppercased word text. Longer labels are tried first so
+    they win over labels they contain.
+    """
+    ordered = sorted(field_labels.items(), key=lambda item: len(item[1]), reverse=True)
+    return re.compile('|'.join(
+        f'(?P<{key}>{re.escape(label.upper())})' for key, label in ordered
+    ))
+
+
+@lru_cache(maxsize=8)
+def _load_template_json(abs_path, mtime_ns, size, inode):
+    """Parse a template file, cached per (absolute path, mtime, size, inode)
+
+    mtime alone can miss an edit on filesystems with coarse timestamps or
+    when a file is copied with its timestamps preserved; the size and inode
+    from the same stat() call catch most of those.
+
+    The returned dict is shared between callers and must not be mutated.
+    """
+    if orjson is not None:
+        with open(abs_path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(abs_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@contextmanager
+def open_pdf_stream(pdf_path, pdf_bytes=None):
+    """Yield a seekable stream over a PDF's contents for pdfplumber.open
+
+    Prefetched bytes are wrapped in BytesIO. Otherwise the file is memory-mapped,
+    so pdfminer's many small reads and seeks are served from memory rather
+    than through buffered file reads.
+    """
+    if pdf_bytes is not None:
+        yield io.BytesIO(pdf_bytes)
+        return
+
+    with open(pdf_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield f  # An empty file cannot be mapped; let pdfplumber report it
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+@contextmanager
+def atomic_output(output_path, mode='w', **open_kwargs):
+    """Open a temp file next to output_path and swap it in on success
+
+    Records are streamed to the output while they are extracted, so a
+    failure mid-batch must not leave a truncated file over the previous
+    good one: on any exception the temp file is removed and output_path
+    is left untouched.
+    """
+    tmp_path = f"{output_path}.tmp"
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class WordIndex:
+    """Page words with precomputed lookups for positional and keyword searches
+
+    Words are referred to by id, their position in the page-ordered word list.
+    Coordinates are held in NumPy arrays sorted by top, so a box query is a
+    binary search for the Y band plus a vectorized X mask over that band.
+    Field boxes are single lines, so the band holds only a handful of words.
+    """
+
+    def __init__(self, words):
+        """Sort words top to bottom and uppercase their text once per page
+
+        Args:
+            words: word list from page.extract_words()
+        """
+        self.words = words  # Page (reading) order
+        # Plain str: ASCII words are stored compactly, so upper() and 'in' are
+        # already C fast paths; bytes.translate measured slower
+        self.upper_texts = [word['text'].upper() for word in words]
+        self._found = {}  # keyword -> ids, filled by find()
+
+        page_tops = np.array([word['top'] for word in words], dtype=np.float64)
+        page_x0s = np.array([word['x0'] for word in words], dtype=np.float64)
+        page_bottoms = np.array([word['bottom'] for word in words], dtype=np.float64)
+        self.ids_by_top = np.argsort(page_tops, kind='stable')
+        self.tops = page_tops[self.ids_by_top]
+        self.x0s = page_x0s[self.ids_by_top]
+        self.bottoms = page_bottoms[self.ids_by_top]
+
+    def _band(self, y_min, y_max, inclusive=True):
+        """Return the slice of top-sorted positions whose top lies between y_min and y_max
+
+        This is the O(log W) lookup every range query starts from; the X
+        filter then only touches the words in that band.
+        """
+        if inclusive:
+            lo = np.searchsorted(self.tops, y_min, side='left')
+            hi = np.searchsorted(self.tops, y_max, side='right')
+        else:
+            lo = np.searchsorted(self.tops, y_min, side='right')
+            hi = np.searchsorted(self.tops, y_max, side='left')
+        return slice(lo, hi)
+
+    def query_ids(self, x_min, y_min, x_max, y_max):
+        """Return ids of words whose (x0, top) corner lies inside the given rectangle"""
+        band = self._band(y_min, y_max)
+        x0s = self.x0s[band]
+        mask = (x0s >= x_min) & (x0s <= x_max)
+        return self.ids_by_top[band][mask].tolist()
+
+    def same_line_ids(self, top, x_after, max_dy=10):
+        """Return ids of words right of x_after whose top is within max_dy of top, in page order"""
+        band = self._band(top - max_dy, top + max_dy, inclusive=False)
+        x0s = self.x0s[band]
+        return sorted(self.ids_by_top[band][x0s > x_after].tolist())
+
+    def section_ids(self, top_min, bottom_max=np.inf):
+        """Return ids of words with top >= top_min and bottom <= bottom_max, in page order"""
+        band = self._band(top_min, np.inf)
+        mask = self.bottoms[band] <= bottom_max
+        return np.sort(self.ids_by_top[band][mask]).tolist()
+
+    def query(self, x_min, y_min, x_max, y_max):
+        """Return words whose (x0, top) corner lies inside the given rectangle"""
+        return [self.words[i] for i in self.query_ids(x_min, y_min, x_max, y_max)]
+
+    def find(self, keyword):
+        """Return ids of words whose uppercased text contains keyword, in page order
+
+        Results are cached per keyword, so sections sharing a header keyword
+        (e.g. 'MAKLUMAT') scan the page once. The returned list must not be mutated.
+        """
+        ids = self._found.get(keyword)
+        if ids is None:
+            ids = self._found[keyword] = [i for i, text in enumerate(self.upper_texts) if keyword in text]
+        return ids
+
+    def first_label_ids(self, word_ids, label_re):
+        """Map each named group of label_re to the first word in word_ids containing it"""
+        upper_texts = self.upper_texts
+        found = {}
+        for i in word_ids:
+            for match in label_re.finditer(upper_texts[i]):
+                found.setdefault(match.lastgroup, i)
+        return found
+
+
 class STRExtractor:
-    def __init__(self, template_path="template.json"):
-        """Initialize extractor with template"""
+    # Expected header text keywords
+    HEADER_KEYWORDS = {
+        'maklumat_pemohon_header': ['MAKLUMAT', 'PEMOHON'],
+        'maklumat_pasangan_header': ['MAKLUMAT', 'PASANGAN'],
+        'maklumat_anak_header': ['MAKLUMAT', 'ANAK'],
+        'maklumat_waris_header': ['MAKLUMAT', 'WARIS']
+    }
+
+    # Matches any header keyword in a single scan of a word's text
+    HEADER_KEYWORD_RE = re.compile('|'.join(
+        sorted({kw for kws in HEADER_KEYWORDS.values() for kw in kws})
+    ))
+
+    # Field labels for the header-positioned sections
+    WARIS_FIELD_LABELS = {
+        'hubungan': 'Hubungan',
+        'no_pengenalan': 'No Pengenalan',
+        'nama': 'Nama',
+        'no_telefon': 'No Telefon'
+    }
+    PASANGAN_FIELD_LABELS = {
+        'nama': 'Nama',
+        'jenis_pengenalan': 'Jenis Pengenalan',
+        'no_mykad': 'MyKAD',
+        'negara_asal': 'Negara Asal',
+        'no_telefon': 'No. Telefon',
+        'jantina': 'Jantina',
+        'pekerjaan': 'Pekerjaan',
+        'nama_bank': 'Nama Bank Pasangan',
+        'no_akaun_bank': 'No Akaun Bank Pasangan'
+    }
+    WARIS_LABEL_RE = compile_label_pattern(WARIS_FIELD_LABELS)
+    PASANGAN_LABEL_RE = compile_label_pattern(PASANGAN_FIELD_LABELS)
+    WARIS_LABELS_UPPER = {key: label.upper() for key, label in WARIS_FIELD_LABELS.items()}
+    PASANGAN_LABELS_UPPER = {key: label.upper() for key, label in PASANGAN_FIELD_LABELS.items()}
+
+    # Header keywords that identify the ANAK table
+    ANAK_TABLE_KEYWORDS = frozenset(['NAMA', 'MYKAD', 'UMUR'])
+    ANAK_TABLE_KEYWORD_RE = re.compile('|'.join(sorted(ANAK_TABLE_KEYWORDS)))
+
+    def __init__(self, template_path="template.json", template=None):
+        """Initialize extractor with template
+
+        Args:
+            template_path: template JSON file, or None for an in-memory template
+            template: already parsed template dict; if given, template_path is
+                not read (see from_dict)
+        """
         self.template_path = template_path
-        self.load_template(template_path)
+        if template is None:
+            self.load_template(template_path)
+        else:
+            self.set_template(template)
+        self.base_template = template if template is not None else self.read_template(template_path)
+
+        # Keep both stage-2 templates in memory so extract_from_pdf can switch
+        # between them without re-reading JSON for every PDF
+        self.stage2_templates = {}
+        for name in ("template_with_pasangan.json", "template_without_pasangan.json"):
+            if Path(name).exists():
+                self.stage2_templates[name] = self.read_template(name)
+
+    @classmethod
+    def from_dict(cls, template):
+        """Create an extractor from a template dict, without a template file"""
+        return cls(template_path=None, template=template)
+
+    def read_template(self, template_path):
+        """Read and parse a template JSON file (cached until the file changes)"""
+        abs_path = os.path.abspath(template_path)
+        st = os.stat(abs_path)
+        return _load_template_json(abs_path, st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def set_template(self, template):
+        """Make a parsed template the active one"""
+        self.fields = template['fields']
+        self.pdf_dimensions = template.get('pdf_dimensions', {})
+        self.field_plan = self.build_field_plan(self.fields)
+
+    def build_field_plan(self, fields):
+        """Precompute how each template field is extracted and where its value goes
+
+        Args:
+            fields: template fields dict
+
+        Returns:
+            List of (field_name, box, section, group, output_name, tolerance) tuples.
+            section picks the Y-offset ('pemohon', 'pasangan', 'anak', 'waris');
+            group is the nested output dict ('pasangan', 'waris') or None for top level.
+        """
+        plan = []
+        for field_name, box in fields.items():
+            # Skip header fields (not actual data)
+            if field_name.endswith('_header'):
+                continue
+
+            # Determine section-specific offset and output grouping by prefix
+            if field_name.startswith('waris_'):
+                section, group, output_name = 'waris', 'waris', field_name.replace('waris_', '')
+            elif field_name.startswith('pasangan_'):
+                section, group, output_name = 'pasangan', 'pasangan', field_name.replace('pasangan_', '')
+            elif field_name.startswith('anak_'):
+                section, group, output_name = 'anak', None, field_name
+            else:
+                # Main applicant section (MAKLUMAT PEMOHON)
+                section, group, output_name = 'pemohon', None, field_name
+
+            # Determine field-specific tolerance (jantina needs tighter tolerance)
+            tolerance = 3 if field_name == 'jantina' else 5
+
+            plan.append((field_name, box, section, group, output_name, tolerance))
+
+        return plan
 
     def load_template(self, template_path):
         """Load template from file"""
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template = json.load(f)
+        self.set_template(self.read_template(template_path))
+        logger.info("Loaded template with %d fields from %s", len(self.fields), template_path)
 
-        self.fields = template['fields']
-        self.pdf_dimensions = template.get('pdf_dimensions', {})
-        print(f"Loaded template with {len(self.fields)} fields from {template_path}")
+    def header_search_window(self, header_field_name):
+        """Return the (x_min, y_min, x_max, y_max) rectangle searched for a section header"""
+        box = self.fields[header_field_name]
+
+        # Use larger search range for waris section (variable position due to anak section)
+        search_range = 200 if header_field_name == 'maklumat_waris_header' else 50
+
+        return (box['x'] - 20, box['y'] - search_range,
+                box['x'] + box['width'] + 20, box['y'] + search_range)
 
-    def detect_section_offset(self, page, header_field_name):
+    def find_header_candidates(self, index, header_field_names=None):
+        """Return ids of words containing any section header keyword, in page order
+
+        Only words inside the template-predicted search windows of the given
+        headers (default: all known headers) are scanned.
+        """
+        if header_field_names is None:
+            header_field_names = self.HEADER_KEYWORDS
+        windows = [self.header_search_window(name) for name in header_field_names if name in self.fields]
+        if not windows:
+            return []
+
+        # Bounding rectangle of all search windows
+        x_mins, y_mins, x_maxs, y_maxs = zip(*windows)
+        band_ids = index.query_ids(min(x_mins), min(y_mins), max(x_maxs), max(y_maxs))
+
+        search = self.HEADER_KEYWORD_RE.search
+        upper_texts = index.upper_texts
+        return sorted(i for i in band_ids if search(upper_texts[i]))
+
+    def detect_all_section_offsets(self, index):
+        """Detect Y-offsets for all sections with a single pass over the page words
+
+        Args:
+            index: WordIndex of the page's words
+
+        Returns:
+            Dict mapping section name ('pemohon', 'pasangan', 'anak', 'waris') to Y-offset
+        """
+        candidate_ids = self.find_header_candidates(index)
+        return {
+            header_field_name.split('_')[1]: self.detect_section_offset(index, header_field_name, candidate_ids)
+            for header_field_name in self.HEADER_KEYWORDS
+        }
+
+    def detect_section_offset(self, index, header_field_name, candidate_ids=None):
         """Detect Y-offset for a section by finding its header position
 
         Args:
-            page: pdfplumber page object
+            index: WordIndex of the page's words
             header_field_name: name of the header field (e.g., 'maklumat_waris_header')
+            candidate_ids: ids from find_header_candidates(), shared between headers
+                by detect_all_section_offsets (computed here if not given)
 
         Returns:
             Y-offset in pixels (positive = shifted down, negative = shifted up)
@@ -38,52 +377,46 @@ class STRExtractor:
         if header_field_name not in self.fields:
             return 0
 
-        template_box = self.fields[header_field_name]
-        template_y = template_box['y']
-        template_x = template_box['x']
-        template_w = template_box['width']
-
-        # Expected header text keywords
-        header_keywords = {
-            'maklumat_pemohon_header': ['MAKLUMAT', 'PEMOHON'],
-            'maklumat_pasangan_header': ['MAKLUMAT', 'PASANGAN'],
-            'maklumat_anak_header': ['MAKLUMAT', 'ANAK'],
-            'maklumat_waris_header': ['MAKLUMAT', 'WARIS']
-        }
+        if candidate_ids is None:
+            candidate_ids = self.find_header_candidates(index, [header_field_name])
 
-        keywords = header_keywords.get(header_field_name, ['MAKLUMAT'])
+        template_y = self.fields[header_field_name]['y']
+        keywords = self.HEADER_KEYWORDS.get(header_field_name, ['MAKLUMAT'])
 
-        # Use larger search range for waris section (variable position due to anak section)
-        search_range = 200 if header_field_name == 'maklumat_waris_header' else 50
+        # Search window around the template header position
+        x_min, y_min, x_max, y_max = self.header_search_window(header_field_name)
 
-        try:
-            # Get all words in the page
-            words = page.extract_words()
+        # Header keyword words inside the search window, in page order
+        words = index.words
+        window_ids = [
+            i for i in candidate_ids
+            if x_min <= words[i]['x0'] <= x_max and y_min <= words[i]['top'] <= y_max
+        ]
 
+        try:
             # For waris header, need to find both MAKLUMAT and WARIS nearby
             if header_field_name == 'maklumat_waris_header':
                 # Find all MAKLUMAT words first
                 maklumat_words = []
                 waris_words = []
 
-                print(f"  DEBUG: Searching for waris header with:")
-                print(f"         X range: [{template_x - 20}, {template_x + template_w + 20}]")
-                print(f"         Y range: [{template_y - search_range}, {template_y + search_range}]")
+                logger.debug("  Searching for waris header with:")
+                logger.debug("         X range: [%s, %s]", x_min, x_max)
+                logger.debug("         Y range: [%s, %s]", y_min, y_max)
 
-                for word in words:
-                    word_text = word['text'].upper()
+                # Look for keywords in expected X range and expanded Y range
+                for i in window_ids:
+                    word = words[i]
+                    word_text = index.upper_texts[i]
                     word_x = word['x0']
                     word_y = word['top']
 
-                    # Look for keywords in expected X range and expanded Y range
-                    if template_x - 20 <= word_x <= template_x + template_w + 20:
-                        if abs(word_y - template_y) <= search_range:
-                            if 'MAKLUMAT' in word_text:
-                                maklumat_words.append((word_y, word_x, word_text))
-                                print(f"         Found MAKLUMAT at X={word_x:.1f}, Y={word_y:.1f}")
-                            elif 'WARIS' in word_text:
-                                waris_words.append((word_y, word_x, word_text))
-                                print(f"         Found WARIS at X={word_x:.1f}, Y={word_y:.1f}")
+                    if 'MAKLUMAT' in word_text:
+                        maklumat_words.append((word_y, word_x, word_text))
+                        logger.debug("         Found MAKLUMAT at X=%.1f, Y=%.1f", word_x, word_y)
+                    elif 'WARIS' in word_text:
+                        waris_words.append((word_y, word_x, word_text))
+                        logger.debug("         Found WARIS at X=%.1f, Y=%.1f", word_x, word_y)
 
                 # Find MAKLUMAT and WARIS that are on the same line (within 5px vertically)
                 for mak_y, mak_x, mak_text in maklumat_words:
@@ -91,45 +424,87 @@ class STRExtractor:
                         if abs(mak_y - war_y) <= 5:  # Same line
                             actual_y = mak_y
                             offset = int(actual_y - template_y)
-                            print(f"  📍 {header_field_name}: Found at Y={actual_y:.1f} (template Y={template_y}), offset={offset:+d}px")
+                            logger.info("  📍 %s: Found at Y=%.1f (template Y=%s), offset=%+dpx",
+                                        header_field_name, actual_y, template_y, offset)
                             return offset
 
-                # If not found, print debug info
-                print(f"  ⚠️  {header_field_name}: Could not find both MAKLUMAT and WARIS nearby")
-                print(f"      Found {len(maklumat_words)} MAKLUMAT words, {len(waris_words)} WARIS words in search range")
+                # If not found, log debug info
+                logger.debug("  ⚠️  %s: Could not find both MAKLUMAT and WARIS nearby", header_field_name)
+                logger.debug("      Found %d MAKLUMAT words, %d WARIS words in search range",
+                             len(maklumat_words), len(waris_words))
                 return 0
 
             # For other headers, use original logic
             candidates = []
-            for word in words:
-                word_text = word['text'].upper()
-                word_x = word['x0']
-                word_y = word['top']
+            for i in window_ids:
+                word_text = index.upper_texts[i]
 
-                # Check if word matches any keyword and is in correct X range
-                if (any(kw in word_text for kw in keywords) and
-                    template_x - 20 <= word_x <= template_x + template_w + 20 and
-                    abs(word_y - template_y) <= search_range):
-                    candidates.append((word_y, word_text))
+                # Check if word matches any keyword
+                if any(kw in word_text for kw in keywords):
+                    candidates.append((words[i]['top'], word_text))
 
             if candidates:
                 # Use the first matching candidate (should be the header)
                 actual_y = candidates[0][0]
                 offset = int(actual_y - template_y)
                 if offset != 0:
-                    print(f"  📍 {header_field_name}: Y offset {offset:+d}px detected")
+                    logger.info("  📍 %s: Y offset %+dpx detected", header_field_name, offset)
                 return offset
 
         except Exception as e:
-            print(f"  Warning: Error detecting offset for {header_field_name}: {e}")
+            logger.warning("  Warning: Error detecting offset for %s: %s", header_field_name, e)
 
         return 0  # No offset if header not found
 
-    def extract_text_from_box(self, page, box, y_offset=0, tolerance=5):
+    def make_box_extractor(self, index):
+        """Build a text-from-box function bound to one page's words
+
+        The returned extract(box, y_offset=0, tolerance=5) behaves like
+        extract_text_from_box() with the page-level lookups resolved once,
+        which keeps the per-field loop in extract_from_pdf cheap.
+
+        Args:
+            index: WordIndex of the page's words
+
+        Returns:
+            Function taking (box, y_offset, tolerance) and returning extracted text
+        """
+        query = index.query
+        collapse_whitespace = WHITESPACE_RE.sub
+        strip_trailing_punct = TRAILING_PUNCT_RE.sub
+
+        def extract(box, y_offset=0, tolerance=5):
+            x, y, w, h = BOX_COORDS(box)
+
+            # Apply section offset to Y coordinate
+            y_adjusted = y + y_offset
+
+            try:
+                # Filter words within bounding box with Y-tolerance
+                # Using tight tolerance since we already applied section offset
+                field_words = query(x, y_adjusted - tolerance, x + w, y_adjusted + h + tolerance)
+
+                if field_words:
+                    # Sort by position (top to bottom, left to right)
+                    field_words.sort(key=WORD_POSITION)
+                    # Join words preserving order
+                    text = ' '.join([word['text'] for word in field_words])
+                    # Collapse whitespace runs, then remove trailing punctuation (colons, semicolons, etc.)
+                    return strip_trailing_punct('', collapse_whitespace(' ', text).strip())
+
+                return ""
+
+            except Exception as e:
+                logger.warning("  Warning: Error extracting from box %s: %s", box, e)
+                return ""
+
+        return extract
+
+    def extract_text_from_box(self, index, box, y_offset=0, tolerance=5):
         """Extract text using word filtering with section-based Y-offset and tolerance
 
         Args:
-            page: pdfplumber page object
+            index: WordIndex of the page's words
             box: dictionary with 'x', 'y', 'width', 'height' keys
             y_offset: Section-specific Y-offset in pixels
             tolerance: Y-axis tolerance in pixels (default: 5px, can be reduced for specific fields)
@@ -137,286 +512,294 @@ class STRExtractor:
         Returns:
             Extracted text string
         """
-        x, y, w, h = box['x'], box['y'], box['width'], box['height']
+        return self.make_box_extractor(index)(box, y_offset, tolerance)
 
-        # Apply section offset to Y coordinate
-        y_adjusted = y + y_offset
+    def find_anak_table(self, page, index, min_top=None):
+        """Find the MAKLUMAT ANAK table (columns: NAMA, NO.MYKAD/MYKID, UMUR, STATUS)
 
-        try:
-            # Get all words on page with their coordinates
-            words = page.extract_words()
-
-            # Filter words within bounding box with Y-tolerance
-            # Using tight tolerance since we already applied section offset
-            field_words = [
-                word for word in words
-                if (x <= word['x0'] <= x + w) and
-                   (y_adjusted - tolerance <= word['top'] <= y_adjusted + h + tolerance)
-            ]
-
-            if field_words:
-                # Sort by position (top to bottom, left to right)
-                field_words.sort(key=lambda w: (w['top'], w['x0']))
-                # Join words preserving order
-                text = ' '.join([w['text'] for w in field_words])
-                # Clean up the text
-                text = text.strip()
-                # Replace multiple spaces with single space
-                text = ' '.join(text.split())
-                # Remove trailing punctuation (colons, semicolons, etc.)
-                text = text.rstrip(':;,.')
-                return text
-
-            return ""
+        Tables are detected once for the whole page. Only the header row of
+        each is read, from the cached word index; the full table is extracted
+        once it is recognised.
 
-        except Exception as e:
-            print(f"  Warning: Error extracting from box {box}: {e}")
-            return ""
+        Args:
+            page: pdfplumber page object
+            index: WordIndex of the page's words
+            min_top: if given, tables starting at or below this Y are tried first
 
-    def extract_anak_table(self, page):
-        """Extract MAKLUMAT ANAK table using pdfplumber table detection"""
-        try:
-            # Extract all tables from the page
-            tables = page.extract_tables()
+        Returns:
+            Extracted table rows, or None if no ANAK table was found
+        """
+        tables = page.find_tables()
+        if not tables:
+            return None
+
+        if min_top is not None:
+            # Stable sort: tables below min_top first, each group in detection order
+            tables = sorted(tables, key=lambda table: table.bbox[1] < min_top)
+
+        for table in tables:
+            if len(table.rows) < 2:
+                continue
+
+            # Check if this is the ANAK table by looking at headers
+            if self.is_anak_table_header(index, index.query_ids(*table.rows[0].bbox)):
+                return table.extract()
+
+        return None
+
+    def is_anak_table_header(self, index, header_ids):
+        """Check whether the given header row words contain every ANAK table keyword"""
+        found = set()
+        for i in header_ids:
+            found.update(m.group() for m in self.ANAK_TABLE_KEYWORD_RE.finditer(index.upper_texts[i]))
+            if found == self.ANAK_TABLE_KEYWORDS:
+                return True
+        return False
+
+    def anak_column_fields(self, header):
+        """Map ANAK table column indexes to child field names from the header row"""
+        column_fields = {}
+        for i, cell in enumerate(header):
+            if not cell:
+                continue
+            # Normalize field names
+            field_name = str(cell).strip().lower()
+            if 'nama' in field_name:
+                column_fields[i] = 'nama'
+            elif 'mykad' in field_name or 'mykid' in field_name:
+                column_fields[i] = 'no_mykad'
+            elif 'umur' in field_name:
+                column_fields[i] = 'umur'
+            elif 'status' in field_name or 'hubungan' in field_name:
+                column_fields[i] = 'status'
+        return column_fields
+
+    def extract_anak_table(self, page, index, y_offset=0):
+        """Extract MAKLUMAT ANAK table using pdfplumber table detection
 
-            # Find the MAKLUMAT ANAK table (usually contains columns: NAMA, NO.MYKAD/MYKID, UMUR, STATUS)
-            for table in tables:
-                if not table or len(table) < 2:
-                    continue
+        Args:
+            page: pdfplumber page object
+            index: WordIndex of the page's words
+            y_offset: Section-specific Y-offset of the ANAK header
 
-                # Check if this is the ANAK table by looking at headers
-                header = table[0] if table else []
-                header_text = ' '.join([str(cell or '').upper() for cell in header])
-
-                if 'NAMA' in header_text and 'MYKAD' in header_text and 'UMUR' in header_text:
-                    # Found the ANAK table
-                    children = []
-                    for row in table[1:]:  # Skip header row
-                        if not row or all(cell is None or str(cell).strip() == '' for cell in row):
-                            continue  # Skip empty rows
-
-                        # Extract child data (handle variable column positions)
-                        child = {}
-                        for i, cell in enumerate(row):
-                            cell_value = str(cell).strip() if cell else ""
-                            if i < len(header) and header[i]:
-                                field_name = str(header[i]).strip().lower()
-                                # Normalize field names
-                                if 'nama' in field_name:
-                                    child['nama'] = cell_value
-                                elif 'mykad' in field_name or 'mykid' in field_name:
-                                    child['no_mykad'] = cell_value
-                                elif 'umur' in field_name:
-                                    child['umur'] = cell_value
-                                elif 'status' in field_name or 'hubungan' in field_name:
-                                    child['status'] = cell_value
-
-                        if child:  # Only add if we extracted something
-                            children.append(child)
-
-                    print(f"  MAKLUMAT ANAK: Extracted {len(children)} children")
-                    return children
-
-            print("  MAKLUMAT ANAK: No table found")
-            return []
+        Returns:
+            List of child dicts
+        """
+        try:
+            # Prefer tables below the ANAK header, falling back to the rest of the page
+            min_top = None
+            if 'maklumat_anak_header' in self.fields:
+                min_top = self.fields['maklumat_anak_header']['y'] + y_offset - 5
+            table = self.find_anak_table(page, index, min_top)
+
+            if table is None:
+                logger.info("  MAKLUMAT ANAK: No table found")
+                return []
+
+            column_fields = self.anak_column_fields(table[0])
+            children = []
+            for row in table[1:]:  # Skip header row
+                if not row or all(cell is None or str(cell).strip() == '' for cell in row):
+                    continue  # Skip empty rows
+
+                # Extract child data (handle variable column positions)
+                child = {}
+                for i, cell in enumerate(row):
+                    field_name = column_fields.get(i)
+                    if field_name:
+                        child[field_name] = str(cell).strip() if cell else ""
+
+                if child:  # Only add if we extracted something
+                    children.append(child)
+
+            logger.info("  MAKLUMAT ANAK: Extracted %d children", len(children))
+            return children
 
         except Exception as e:
-            print(f"  Warning: Error extracting ANAK table: {e}")
+            logger.warning("  Warning: Error extracting ANAK table: %s", e)
             return []
 
-    def extract_waris_section(self, page):
-        """Extract MAKLUMAT WARIS using header-based positioning"""
+    def find_section_header_bottom(self, index, keyword):
+        """Find the bottom of a "MAKLUMAT <keyword>" header, or None if absent"""
+        words = index.words
+        maklumat_ids = index.find('MAKLUMAT')
+        for i in index.find(keyword):
+            word = words[i]
+            if 'MAKLUMAT' in index.upper_texts[i]:
+                return word['bottom']
+            # Check if MAKLUMAT is nearby
+            for j in maklumat_ids:
+                other_word = words[j]
+                if abs(other_word['top'] - word['top']) < 5:
+                    return max(word['bottom'], other_word['bottom'])
+        return None
+
+    def extract_labeled_section(self, index, section, labels_upper, label_re,
+                                next_section_keywords=(), skip_label_words=False,
+                                not_found_hint=""):
+        """Extract a "label : value" section positioned by its MAKLUMAT header
+
+        Args:
+            index: WordIndex of the page's words
+            section: header keyword after MAKLUMAT, e.g. 'WARIS'
+            labels_upper: {field_key: uppercased label}
+            label_re: compile_label_pattern() of the same labels
+            next_section_keywords: MAKLUMAT headers that end the section
+                (default: the section runs to the bottom of the page)
+            skip_label_words: drop value words that are part of the label
+            not_found_hint: appended to the header-not-found message
+
+        Returns:
+            Dict of field values ("" when a label is missing), or {} if the
+            header is not found
+        """
+        words = index.words
+        upper_texts = index.upper_texts
         try:
-            # Find the "MAKLUMAT WARIS" header text
-            text_objects = page.extract_words()
-
-            waris_header_y = None
-            for word in text_objects:
-                text = word['text'].upper()
-                if 'MAKLUMAT' in text and 'WARIS' in text:
-                    waris_header_y = word['bottom']
-                    break
-                elif 'WARIS' in text:
-                    # Check if MAKLUMAT is nearby
-                    for other_word in text_objects:
-                        if abs(other_word['top'] - word['top']) < 5 and 'MAKLUMAT' in other_word['text'].upper():
-                            waris_header_y = max(word['bottom'], other_word['bottom'])
+            header_y = self.find_section_header_bottom(index, section)
+            if not header_y:
+                logger.info("  MAKLUMAT %s: Header not found%s", section, not_found_hint)
+                return {}
+
+            # Find the next section header to limit extraction area
+            next_section_y = float('inf')
+            if next_section_keywords:
+                for i in index.find('MAKLUMAT'):
+                    if words[i]['top'] > header_y:
+                        text = upper_texts[i]
+                        if any(kw in text for kw in next_section_keywords):
+                            next_section_y = words[i]['top']
                             break
-                    if waris_header_y:
-                        break
 
-            if not waris_header_y:
-                print("  MAKLUMAT WARIS: Header not found")
-                return {}
+            section_data = {}
 
-            # Define approximate field positions relative to header
-            # These are rough estimates - the actual values are extracted from text near these positions
-            field_labels = {
-                'hubungan': 'Hubungan',
-                'no_pengenalan': 'No Pengenalan',
-                'nama': 'Nama',
-                'no_telefon': 'No Telefon'
-            }
-
-            waris_data = {}
-
-            # Extract text in the WARIS section (from header to bottom of page)
-            waris_bbox = (0, waris_header_y, page.width, page.height)
-            waris_section = page.within_bbox(waris_bbox)
-            waris_words = waris_section.extract_words()
-
-            # For each field, find the label and extract the value after it
-            for field_key, label_text in field_labels.items():
-                label_found = False
-                for i, word in enumerate(waris_words):
-                    if label_text.upper() in word['text'].upper():
-                        label_found = True
-                        # Find text on the same line or slightly below (within 10px)
-                        label_y = word['top']
-                        label_x_end = word['x1']
-
-                        # Collect all text after the label on the same line
-                        value_parts = []
-                        for other_word in waris_words:
-                            # Check if word is on the same line and to the right of label
-                            if abs(other_word['top'] - label_y) < 10 and other_word['x0'] > label_x_end:
-                                # Skip colons
-                                if other_word['text'].strip() != ':':
-                                    value_parts.append(other_word['text'])
-
-                        if value_parts:
-                            waris_data[field_key] = ' '.join(value_parts).strip()
-                        else:
-                            waris_data[field_key] = ""
-                        break
-
-                if not label_found:
-                    waris_data[field_key] = ""
-
-            print(f"  MAKLUMAT WARIS: Extracted {len([v for v in waris_data.values() if v])} fields")
-            return waris_data
+            # Words in the section (from header to next section)
+            section_ids = index.section_ids(header_y, next_section_y)
+            in_section = set(section_ids)
+
+            # Locate every label in one pass over the section
+            label_ids = index.first_label_ids(section_ids, label_re)
+
+            # For each field, extract the value after its label
+            for field_key, lu in labels_upper.items():
+                i = label_ids.get(field_key)
+                if i is None:
+                    section_data[field_key] = ""
+                    continue
+
+                # Collect all text after the label on the same line (within 10px)
+                value_parts = []
+                for j in index.same_line_ids(words[i]['top'], words[i]['x1']):
+                    if j not in in_section:
+                        continue
+                    # Skip colons (and field labels, if asked)
+                    text = words[j]['text'].strip()
+                    if text == ':' or (skip_label_words and upper_texts[j] in lu):
+                        continue
+                    value_parts.append(text)
+
+                section_data[field_key] = ' '.join(value_parts).strip()
+
+            logger.info("  MAKLUMAT %s: Extracted %d fields", section, sum(1 for v in section_data.values() if v))
+            return section_data
 
         except Exception as e:
-            print(f"  Warning: Error extracting WARIS section: {e}")
+            logger.warning("  Warning: Error extracting %s section: %s", section, e)
             return {}
 
-    def extract_pasangan_section(self, page):
+    def extract_waris_section(self, index):
+        """Extract MAKLUMAT WARIS using header-based positioning"""
+        return self.extract_labeled_section(index, 'WARIS', self.WARIS_LABELS_UPPER,
+                                            self.WARIS_LABEL_RE)
+
+    def extract_pasangan_section(self, index):
         """Extract MAKLUMAT PASANGAN using header-based positioning"""
-        try:
-            # Find the "MAKLUMAT PASANGAN" header text
-            text_objects = page.extract_words()
-
-            pasangan_header_y = None
-            for word in text_objects:
-                text = word['text'].upper()
-                if 'MAKLUMAT' in text and 'PASANGAN' in text:
-                    pasangan_header_y = word['bottom']
-                    break
-                elif 'PASANGAN' in text:
-                    # Check if MAKLUMAT is nearby
-                    for other_word in text_objects:
-                        if abs(other_word['top'] - word['top']) < 5 and 'MAKLUMAT' in other_word['text'].upper():
-                            pasangan_header_y = max(word['bottom'], other_word['bottom'])
-                            break
-                    if pasangan_header_y:
-                        break
+        return self.extract_labeled_section(
+            index, 'PASANGAN', self.PASANGAN_LABELS_UPPER, self.PASANGAN_LABEL_RE,
+            next_section_keywords=('ANAK', 'WARIS'), skip_label_words=True,
+            not_found_hint=" (applicant may not have spouse)")
 
-            if not pasangan_header_y:
-                print("  MAKLUMAT PASANGAN: Header not found (applicant may not have spouse)")
-                return {}
+    def extract_planned_fields(self, extract_box, offsets, page_height):
+        """Extract every field of the active template in one pass over its field plan
 
-            # Find the next section header to limit extraction area
-            next_section_y = page.height
-            for word in text_objects:
-                if word['top'] > pasangan_header_y:
-                    text = word['text'].upper()
-                    if 'MAKLUMAT' in text and ('ANAK' in text or 'WARIS' in text):
-                        next_section_y = word['top']
-                        break
-
-            # Define field labels for PASANGAN
-            field_labels = {
-                'nama': 'Nama',
-                'jenis_pengenalan': 'Jenis Pengenalan',
-                'no_mykad': 'MyKAD',
-                'negara_asal': 'Negara Asal',
-                'no_telefon': 'No. Telefon',
-                'jantina': 'Jantina',
-                'pekerjaan': 'Pekerjaan',
-                'nama_bank': 'Nama Bank Pasangan',
-                'no_akaun_bank': 'No Akaun Bank Pasangan'
-            }
-
-            pasangan_data = {}
-
-            # Extract text in the PASANGAN section (from header to next section)
-            pasangan_bbox = (0, pasangan_header_y, page.width, next_section_y)
-            pasangan_section = page.within_bbox(pasangan_bbox)
-            pasangan_words = pasangan_section.extract_words()
-
-            # For each field, find the label and extract the value after it
-            for field_key, label_text in field_labels.items():
-                label_found = False
-                for i, word in enumerate(pasangan_words):
-                    if label_text.upper() in word['text'].upper():
-                        label_found = True
-                        # Find text on the same line or slightly below (within 10px)
-                        label_y = word['top']
-                        label_x_end = word['x1']
-
-                        # Collect all text after the label on the same line
-                        value_parts = []
-                        for other_word in pasangan_words:
-                            # Check if word is on the same line and to the right of label
-                            if abs(other_word['top'] - label_y) < 10 and other_word['x0'] > label_x_end:
-                                # Skip colons and field labels
-                                text = other_word['text'].strip()
-                                if text != ':' and text.upper() not in label_text.upper():
-                                    value_parts.append(text)
-
-                        if value_parts:
-                            pasangan_data[field_key] = ' '.join(value_parts).strip()
-                        else:
-                            pasangan_data[field_key] = ""
-                        break
-
-                if not label_found:
-                    pasangan_data[field_key] = ""
-
-            print(f"  MAKLUMAT PASANGAN: Extracted {len([v for v in pasangan_data.values() if v])} fields")
-            return pasangan_data
+        Args:
+            extract_box: function from make_box_extractor() for the page
+            offsets: section Y-offsets from detect_all_section_offsets()
+            page_height: page height, used to skip boxes shifted off the page
 
-        except Exception as e:
-            print(f"  Warning: Error extracting PASANGAN section: {e}")
-            return {}
+        Returns:
+            (all_fields, pasangan_fields, waris_fields) dicts
+        """
+        log_fields = logger.isEnabledFor(logging.DEBUG)
+        all_fields = {}
+        pasangan_fields = {}
+        waris_fields = {}
+        groups = {None: all_fields, 'pasangan': pasangan_fields, 'waris': waris_fields}
+
+        for field_name, box, section, group, output_name, tolerance in self.field_plan:
+            offset = offsets[section]
+
+            # Skip boxes pushed entirely off the page by the section offset
+            # (e.g. PASANGAN fields when the template doesn't match the layout)
+            y_adjusted = box['y'] + offset
+            if (y_adjusted - tolerance > page_height or
+                    y_adjusted + box['height'] + tolerance < 0):
+                text = ""
+            else:
+                # Extract with section offset and field-specific tolerance
+                text = extract_box(box, y_offset=offset, tolerance=tolerance)
 
-    def extract_from_pdf(self, pdf_path):
-        """Extract all fields from a PDF with two-stage template selection"""
-        print(f"\nExtracting from: {pdf_path}")
+            groups[group][output_name] = text
 
-        with pdfplumber.open(pdf_path) as pdf:
+            if log_fields:
+                log_name = f"{group}.{output_name}" if group else output_name
+                logger.debug("  %s: %s%s", log_name, text[:50], '...' if len(text) > 50 else '')
+
+        return all_fields, pasangan_fields, waris_fields
+
+    def extract_from_pdf(self, pdf_path, pdf_bytes=None):
+        """Extract all fields from a PDF with two-stage template selection
+
+        Args:
+            pdf_path: path to the PDF file
+            pdf_bytes: PDF file contents, if already read into memory (e.g. prefetched
+                by extract_multiple); pdf_path is then only used for messages
+        """
+        logger.info("\nExtracting from: %s", pdf_path)
+
+        with open_pdf_stream(pdf_path, pdf_bytes) as stream, pdfplumber.open(stream) as pdf:
             page = pdf.pages[0]  # Assuming single page form
 
+            # Parse the page layout and build the word index once; stage 1 (template
+            # selection) and stage 2 (all fields) both query this same index
+            index = WordIndex(page.extract_words())
+            extract_box = self.make_box_extractor(index)
+
             # STAGE 1: Quick extraction of status_perkahwinan to determine template
-            print("\n  === STAGE 1: Determining template ===")
+            logger.info("\n  === STAGE 1: Determining template ===")
             status_perkahwinan = ""
             if 'status_perkahwinan' in self.fields:
                 status_box = self.fields['status_perkahwinan']
-                status_perkahwinan = self.extract_text_from_box(page, status_box).upper()
-                print(f"  Status Perkahwinan: {status_perkahwinan}")
+                status_perkahwinan = extract_box(status_box).upper()
+                logger.info("  Status Perkahwinan: %s", status_perkahwinan)
 
             # Determine which template to use
             if 'KAHWIN' in status_perkahwinan:
                 template_to_use = "template_with_pasangan.json"
-                print(f"  → Using template WITH PASANGAN")
+                logger.info("  → Using template WITH PASANGAN")
             else:
                 template_to_use = "template_without_pasangan.json"
-                print(f"  → Using template WITHOUT PASANGAN")
-
-            # STAGE 2: Reload appropriate template and extract all fields
-            if template_to_use != Path(self.template_path).name:
-                print(f"  Reloading template: {template_to_use}")
-                self.load_template(template_to_use)
+                logger.info("  → Using template WITHOUT PASANGAN")
+
+            # STAGE 2: Switch to the appropriate template and extract all fields
+            if self.template_path is None or template_to_use != Path(self.template_path).name:
+                template = self.stage2_templates.get(template_to_use)
+                if template is None:
+                    logger.info("  Reloading template: %s", template_to_use)
+                    self.load_template(template_to_use)
+                else:
+                    logger.info("  Switching to template: %s", template_to_use)
+                    self.set_template(template)
 
             # Verify PDF dimensions match template (optional warning)
             if self.pdf_dimensions:
@@ -424,60 +807,22 @@ class STRExtractor:
                 expected_h = self.pdf_dimensions.get('height')
                 if expected_w and expected_h:
                     if abs(page.width - expected_w) > 10 or abs(page.height - expected_h) > 10:
-                        print(f"  ⚠ Warning: PDF dimensions don't match template")
-                        print(f"    Expected: {expected_w}x{expected_h}, Got: {page.width}x{page.height}")
+                        logger.warning("  ⚠ Warning: PDF dimensions don't match template")
+                        logger.warning("    Expected: %sx%s, Got: %sx%s",
+                                       expected_w, expected_h, page.width, page.height)
 
             # Detect section offsets using header anchors
-            print("\n  === Detecting Section Offsets ===")
-            pemohon_offset = self.detect_section_offset(page, 'maklumat_pemohon_header')
-            pasangan_offset = self.detect_section_offset(page, 'maklumat_pasangan_header')
-            anak_offset = self.detect_section_offset(page, 'maklumat_anak_header')
-            waris_offset = self.detect_section_offset(page, 'maklumat_waris_header')
+            logger.info("\n  === Detecting Section Offsets ===")
+            offsets = self.detect_all_section_offsets(index)
 
             # Extract all fields from bounding boxes with section-specific offsets
-            print("\n  === STAGE 2: Extracting all fields ===")
-            all_fields = {}
-            pasangan_fields = {}
-            waris_fields = {}
-
-            for field_name, box in self.fields.items():
-                # Skip header fields (not actual data)
-                if field_name.endswith('_header'):
-                    continue
-
-                # Determine section-specific offset
-                if field_name.startswith('waris_'):
-                    offset = waris_offset
-                elif field_name.startswith('pasangan_'):
-                    offset = pasangan_offset
-                elif field_name.startswith('anak_'):
-                    offset = anak_offset
-                else:
-                    # Main applicant section (MAKLUMAT PEMOHON)
-                    offset = pemohon_offset
-
-                # Determine field-specific tolerance (jantina needs tighter tolerance)
-                tolerance = 3 if field_name == 'jantina' else 5
-
-                # Extract with section offset and field-specific tolerance
-                text = self.extract_text_from_box(page, box, y_offset=offset, tolerance=tolerance)
-
-                # Group fields by prefix
-                if field_name.startswith('pasangan_'):
-                    clean_name = field_name.replace('pasangan_', '')
-                    pasangan_fields[clean_name] = text
-                    print(f"  pasangan.{clean_name}: {text[:50]}{'...' if len(text) > 50 else ''}")
-                elif field_name.startswith('waris_'):
-                    clean_name = field_name.replace('waris_', '')
-                    waris_fields[clean_name] = text
-                    print(f"  waris.{clean_name}: {text[:50]}{'...' if len(text) > 50 else ''}")
-                else:
-                    all_fields[field_name] = text
-                    print(f"  {field_name}: {text[:50]}{'...' if len(text) > 50 else ''}")
+            logger.info("\n  === STAGE 2: Extracting all fields ===")
+            all_fields, pasangan_fields, waris_fields = self.extract_planned_fields(
+                extract_box, offsets, page.height)
 
             # Extract MAKLUMAT ANAK table
-            print("\n  === MAKLUMAT ANAK (Table Extraction) ===")
-            children = self.extract_anak_table(page)
+            logger.info("\n  === MAKLUMAT ANAK (Table Extraction) ===")
+            children = self.extract_anak_table(page, index, y_offset=offsets['anak'])
             all_fields['anak'] = children
 
             # Add grouped sections
@@ -486,46 +831,241 @@ class STRExtractor:
 
         return all_fields
 
-    def extract_multiple(self, pdf_paths):
-        """Extract from multiple PDFs"""
-        all_data = []
+    def extract_multiple(self, pdf_paths, max_workers=None):
+        """Extract from multiple PDFs in parallel worker processes
 
-        for pdf_path in pdf_paths:
+        Returns a list of records; see iter_extract_multiple to stream them.
+        """
+        return list(self.iter_extract_multiple(pdf_paths, max_workers))
+
+    def iter_extract_multiple(self, pdf_paths, max_workers=None):
+        """Extract from multiple PDFs in parallel worker processes, yielding records in order
+
+        A background thread reads the files from disk while the workers parse,
+        staying at most a few PDFs ahead, so only a bounded number of files and
+        records are held in memory at once. PDFs that fail are logged and skipped.
+
+        Args:
+            pdf_paths: list of PDF paths
+            max_workers: number of worker processes (default: one per CPU,
+                never more than there are PDFs); 1 extracts in this process
+        """
+        pdf_paths = list(pdf_paths)
+        max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(pdf_paths)))
+        max_pending = max_workers * 2
+
+        def collect(pdf_path, future):
             try:
-                data = self.extract_from_pdf(pdf_path)
-                data['_source_file'] = str(pdf_path)
-                all_data.append(data)
+                data = future.result()
             except Exception as e:
-                print(f"✗ Error processing {pdf_path}: {e}")
+                logger.error("✗ Error processing %s: %s", pdf_path, str(e) or type(e).__name__)
+                return None
+            data['_source_file'] = str(pdf_path)
+            return data
+
+        if max_workers == 1:
+            # Not worth a process pool: parse here, skipping pickling overhead
+            for pdf_path in pdf_paths:
+                future = Future()
+                try:
+                    future.set_result(self.extract_from_pdf(pdf_path))
+                except Exception as e:
+                    future.set_exception(e)
+                data = collect(pdf_path, future)
+                if data is not None:
+                    yield data
+            return
+
+        pdf_queue = queue.Queue(maxsize=max_pending)
+        threading.Thread(target=_read_pdfs, args=(pdf_paths, pdf_queue), daemon=True).start()
 
-        return all_data
+        def start_pool():
+            return ProcessPoolExecutor(max_workers=max_workers,
+                                       initializer=_init_worker,
+                                       initargs=(self.template_path, self.base_template,
+                                                 logger.getEffectiveLevel()))
+
+        executor = start_pool()
+        try:
+            # Collect in input order so output matches the command line
+            in_flight = deque()
+            while True:
+                item = pdf_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+
+                pdf_path, pdf_bytes, error = item
+                if error is None:
+                    try:
+                        future = executor.submit(_extract_in_worker, pdf_path, pdf_bytes)
+                    except BrokenProcessPool:
+                        # A worker died (e.g. killed, or crashed in native code). PDFs
+                        # in flight on that pool fail individually in collect();
+                        # the rest of the batch goes to a fresh pool
+                        logger.error("✗ Worker process died; restarting the worker pool")
+                        executor.shutdown(wait=False)
+                        executor = start_pool()
+                        future = executor.submit(_extract_in_worker, pdf_path, pdf_bytes)
+                else:
+                    # Unreadable file: report it in order alongside the parsed ones
+                    future = Future()
+                    future.set_exception(error)
+                in_flight.append((pdf_path, future))
+
+                if len(in_flight) >= max_pending:
+                    data = collect(*in_flight.popleft())
+                    if data is not None:
+                        yield data
+
+            while in_flight:
+                data = collect(*in_flight.popleft())
+                if data is not None:
+                    yield data
+        finally:
+            executor.shutdown()
+
+    def record_fieldnames(self):
+        """Return every top-level key an extracted record can have, sorted
+
+        Covers each template extract_from_pdf may switch to, so CSV columns
+        are known before the first record is extracted.
+        """
+        keys = {'anak', 'pasangan', 'waris', '_source_file'}
+        for template in (self.base_template, *self.stage2_templates.values()):
+            for _, _, _, group, output_name, _ in self.build_field_plan(template['fields']):
+                if group is None:
+                    keys.add(output_name)
+        return sorted(keys)
 
     def save_to_json(self, data, output_path):
-        """Save extracted data to JSON"""
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        """Save extracted data to JSON
+
+        data is a single record (dict), or a list or iterable of records;
+        an iterable is written one record at a time as a JSON array.
+        """
+        if orjson is not None:
+            def dumps(obj):
+                return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+        else:
+            def dumps(obj):
+                return json.dumps(obj, indent=2, ensure_ascii=False)
+
+        with atomic_output(output_path, 'w', encoding='utf-8') as f:
+            if isinstance(data, dict):
+                f.write(dumps(data))
+            else:
+                # Same layout as dumping the whole list at indent=2
+                f.write('[')
+                sep = '\n  '
+                for record in data:
+                    f.write(sep + dumps(record).replace('\n', '\n  '))
+                    sep = ',\n  '
+                f.write('\n]' if sep != '\n  ' else ']')
         print(f"\n✓ Saved to {output_path}")
 
-    def save_to_csv(self, data, output_path):
-        """Save extracted data to CSV"""
-        if not data:
+    def save_to_csv(self, data, output_path, fieldnames=None):
+        """Save extracted data to CSV
+
+        Args:
+            data: list or iterable of records
+            output_path: CSV file path
+            fieldnames: column names; when given, records are written as they
+                arrive (see record_fieldnames), otherwise they are collected
+                first to gather every key
+        """
+        records = iter(data)
+        first = next(records, None)
+        if first is None:
             print("No data to save")
             return
 
-        # Get all possible field names
-        fieldnames = set()
-        for record in data:
-            fieldnames.update(record.keys())
+        if fieldnames is None:
+            # Get all possible field names
+            records = [first, *records]
+            fieldnames = set()
+            for record in records:
+                fieldnames.update(record.keys())
+        else:
+            records = itertools.chain([first], records)
+            fieldnames = set(fieldnames) | first.keys()
         fieldnames = sorted(fieldnames)
 
-        with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        with atomic_output(output_path, 'w', newline='', encoding='utf-8-sig') as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
-            writer.writerows(data)
+            writer.writerows(records)
 
         print(f"✓ Saved to {output_path}")
 
 
+# Per-process extractor used by extract_multiple's worker pool
+_worker_extractor = None
+
+
+def _init_worker(template_path, template, log_level):
+    """Create the extractor once per worker process
+
+    The parent's parsed template is passed along, so extractors built with
+    STRExtractor.from_dict work here too. Forked workers inherit the parent's
+    logging setup; spawned ones start unconfigured, so give them the parent's
+    level and format.
+    """
+    global _worker_extractor
+    logging.basicConfig(format='%(message)s')  # No-op if already configured
+    logger.setLevel(log_level)
+    _worker_extractor = STRExtractor(template_path, template=template)
+
+
+def _extract_in_worker(pdf_path, pdf_bytes):
+    """Extract a single PDF inside a worker process"""
+    return _worker_extractor.extract_from_pdf(pdf_path, pdf_bytes)
+
+
+def _read_pdfs(pdf_paths, pdf_queue):
+    """Read PDF files into memory in order and feed them to pdf_queue
+
+    Puts (pdf_path, pdf_bytes, None) per readable file,
+    (pdf_path, None, error) per unreadable one (including e.g. MemoryError
+    on a huge file), then None when done. Should the thread fail outside a
+    file read, the exception itself is put instead of None, so the consumer
+    re-raises it rather than mistaking it for the end of the input.
+    """
+    try:
+        for pdf_path in pdf_paths:
+            try:
+                pdf_queue.put((pdf_path, Path(pdf_path).read_bytes(), None))
+            except Exception as e:
+                pdf_queue.put((pdf_path, None, e))
+    except BaseException as e:
+        pdf_queue.put(e)  # Re-raised by the consumer
+    else:
+        pdf_queue.put(None)
+
+
+def find_missing_paths(paths):
+    """Return the paths that do not exist, in order
+
+    Lists each parent directory once instead of stat-ing every file, which
+    matters for shell-expanded batches of thousands of PDFs. Names not found
+    in the listing (e.g. on case-insensitive filesystems) are stat-ed.
+    """
+    listings = {}
+    missing = []
+    for path in paths:
+        parent = path.parent
+        names = listings.get(parent)
+        if names is None:
+            try:
+                names = listings[parent] = set(os.listdir(parent))
+            except OSError:
+                names = listings[parent] = set()
+        if path.name not in names and not path.exists():
+            missing.append(path)
+    return missing
+
+
 def main():
     import argparse
 
@@ -536,9 +1076,18 @@ def main():
     parser.add_argument('-o', '--output', help='Output file (JSON or CSV)')
     parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
                        help='Output format (default: json)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                       help='Worker processes for multiple PDFs (default: one per CPU)')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                       help='Show extraction progress (-vv: also every field value)')
 
     args = parser.parse_args()
 
+    # Only this module's logger gets more verbose; pdfminer stays at WARNING
+    log_levels = [logging.WARNING, logging.INFO, logging.DEBUG]
+    logging.basicConfig(format='%(message)s')
+    logger.setLevel(log_levels[min(args.verbose, 2)])
+
     # Check template exists
     if not Path(args.template).exists():
         print(f"✗ Error: Template file '{args.template}' not found")
@@ -552,17 +1101,18 @@ def main():
     pdf_paths = [Path(p) for p in args.pdf_files]
 
     # Check all files exist
-    for pdf_path in pdf_paths:
-        if not pdf_path.exists():
+    missing = find_missing_paths(pdf_paths)
+    if missing:
+        for pdf_path in missing:
             print(f"✗ Error: PDF file '{pdf_path}' not found")
-            sys.exit(1)
+        sys.exit(1)
 
-    # Extract data
+    # Extract data; multiple PDFs are streamed to the output file as they finish
     if len(pdf_paths) == 1:
         data = extractor.extract_from_pdf(pdf_paths[0])
         all_data = [data]
     else:
-        all_data = extractor.extract_multiple(pdf_paths)
+        all_data = extractor.iter_extract_multiple(pdf_paths, max_workers=args.workers)
 
     # Save output
     if args.output:
@@ -580,7 +1130,9 @@ def main():
         save_data = all_data[0] if len(pdf_paths) == 1 else all_data
         extractor.save_to_json(save_data, output_path)
     else:
-        extractor.save_to_csv(all_data, output_path)
+        # Streamed records need their columns up front
+        fieldnames = extractor.record_fieldnames() if len(pdf_paths) > 1 else None
+        extractor.save_to_csv(all_data, output_path, fieldnames=fieldnames)
 
     print(f"\n✓ Extraction complete! Processed {len(pdf_paths)} file(s)")
 
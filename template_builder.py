@@ -5,10 +5,24 @@ Interactive interface with draggable boxes and corner handles
 """
 
 import json
+import os
 import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
 from PIL import Image, ImageTk, ImageDraw, ImageFont
-import pdfplumber
+# pdfplumber is imported where it is used: it pulls in pdfminer, which is not
+# needed to show the window when pymupdf is installed
+
+try:
+    import pymupdf  # Optional: renders pages in-process, faster than pdfplumber
+except ImportError:
+    pymupdf = None
+
+try:
+    import orjson  # Optional: faster template reading and writing
+except ImportError:
+    orjson = None
 
 # Pre-populated bounding boxes based on STR form analysis
 # Boxes cover VALUE ONLY (not field labels)
@@ -37,6 +51,81 @@ INITIAL_BOXES = {
     "alamat_emel": {"x": 620, "y": 20, "width": 120, "height": 16},
 }
 
+# Rendered page images kept in memory (least recently used are dropped first)
+PAGE_IMAGE_CACHE_SIZE = 8
+
+# How often the UI checks on a page being rendered in the background (ms)
+RENDER_POLL_MS = 30
+
+def read_json(path):
+    """Read a JSON file"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json(data, path):
+    """Write data to a JSON file, indented by 2 spaces
+
+    The file is written next to the target and swapped in with os.replace,
+    so a crash mid-save never leaves a truncated template behind.
+    """
+    if orjson is not None:
+        content = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        content = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def first_page_size(pdf_path):
+    """Return the (width, height) of a PDF's first page in points"""
+    if pymupdf is None:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            page = pdf.pages[0]
+            return page.width, page.height
+
+    # Read the MediaBox, as pdfplumber (and so the extractor) does; page.rect
+    # would be the CropBox. Like pdfplumber, swap the sides for rotated pages
+    with pymupdf.open(pdf_path) as doc:
+        page = doc[0]
+        width, height = page.mediabox.width, page.mediabox.height
+        if page.rotation % 180:
+            width, height = height, width
+    # MuPDF always returns floats; keep whole-number sizes as ints like pdfplumber,
+    # so saved templates do not change from 612 to 612.0
+    return tuple(int(v) if v.is_integer() else v for v in (width, height))
+
+
+def render_first_page(pdf_path, resolution):
+    """Render the first page of a PDF as an RGB PIL image at the given DPI"""
+    if pymupdf is None:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            return pdf.pages[0].to_image(resolution=resolution).original
+
+    # MuPDF rasterizes at the target scale, downsampling large embedded images
+    # while decoding them instead of allocating them at full resolution
+    zoom = resolution / 72
+    with pymupdf.open(pdf_path) as doc:
+        pixmap = doc[0].get_pixmap(matrix=pymupdf.Matrix(zoom, zoom),
+                                   colorspace=pymupdf.csRGB, alpha=False)
+        return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+
 class BoundingBox:
     """Represents a single bounding box with handles"""
 
@@ -45,11 +134,13 @@ class BoundingBox:
     BOX_COLOR_NORMAL = "green"
     BOX_COLOR_SELECTED = "red"
     BOX_WIDTH = 2
+    ITEM_TAG = "bbox"  # Shared by the canvas items of every box
 
     def __init__(self, canvas, name, x, y, width, height, scale=1.0):
         self.canvas = canvas
         self.name = name
         self.scale = scale
+        self.inv_scale = 1.0 / scale  # update_pdf_coords runs on every drag tick
 
         # Store original PDF coordinates
         self.pdf_x = x
@@ -64,53 +155,70 @@ class BoundingBox:
         self.height = int(height * scale)
 
         self.selected = False
-        self.canvas_items = []
+        self.create_items()
+
+    def create_items(self):
+        """Create the box's canvas items once; draw() then only updates them
+
+        Items are created at their final position and colour, so a new box
+        costs one Tk call per item and needs no draw().
+        """
+        # Every item also carries the group tag so the box moves as one, and
+        # ITEM_TAG so all boxes can be deleted together
+        self.group_tag = f"group_{self.name}"
+        self.rect_id = self.canvas.create_rectangle(
+            self.x, self.y, self.x + self.width, self.y + self.height,
+            outline=self.BOX_COLOR_NORMAL, width=self.BOX_WIDTH,
+            tags=(f"box_{self.name}", self.group_tag, self.ITEM_TAG)
+        )
+        self.label_id = self.canvas.create_text(
+            self.x + 2, self.y - 8, text=self.name, anchor="sw", fill=self.BOX_COLOR_NORMAL,
+            font=("Arial", 8, "bold"), tags=(f"label_{self.name}", self.group_tag, self.ITEM_TAG)
+        )
+
+        # Corner handles stay hidden until the box is selected
+        half = self.HANDLE_SIZE // 2
+        self.handle_ids = {}
+        for cx, cy, corner_type in self.corners():
+            self.handle_ids[corner_type] = self.canvas.create_rectangle(
+                cx - half, cy - half, cx + half, cy + half,
+                fill=self.HANDLE_COLOR, outline="white", state="hidden",
+                tags=(f"handle_{self.name}_{corner_type}", self.group_tag, self.ITEM_TAG)
+            )
+
+        self.canvas_items = [self.rect_id, self.label_id, *self.handle_ids.values()]
         self.handles = []
 
-        self.draw()
+    def corners(self):
+        """Return (x, y, corner_type) for each corner of the display rectangle"""
+        return [
+            (self.x, self.y, "nw"),  # Top-left
+            (self.x + self.width, self.y, "ne"),  # Top-right
+            (self.x, self.y + self.height, "sw"),  # Bottom-left
+            (self.x + self.width, self.y + self.height, "se"),  # Bottom-right
+        ]
 
     def draw(self):
-        """Draw the box and handles on canvas"""
-        # Clear existing items
-        for item in self.canvas_items:
-            self.canvas.delete(item)
-        self.canvas_items.clear()
-
-        # Draw rectangle
+        """Update the box and handles on canvas"""
+        # Update rectangle
         color = self.BOX_COLOR_SELECTED if self.selected else self.BOX_COLOR_NORMAL
-        rect = self.canvas.create_rectangle(
-            self.x, self.y, self.x + self.width, self.y + self.height,
-            outline=color, width=self.BOX_WIDTH, tags=f"box_{self.name}"
-        )
-        self.canvas_items.append(rect)
-
-        # Draw label
-        label = self.canvas.create_text(
-            self.x + 2, self.y - 8,
-            text=self.name, anchor="sw",
-            fill=color, font=("Arial", 8, "bold"),
-            tags=f"label_{self.name}"
-        )
-        self.canvas_items.append(label)
+        self.canvas.coords(self.rect_id, self.x, self.y, self.x + self.width, self.y + self.height)
+        self.canvas.itemconfigure(self.rect_id, outline=color)
 
-        # Draw corner handles if selected
+        # Update label
+        self.canvas.coords(self.label_id, self.x + 2, self.y - 8)
+        self.canvas.itemconfigure(self.label_id, fill=color)
+
+        # Update corner handles (only shown if selected)
         self.handles.clear()
-        if self.selected:
-            corners = [
-                (self.x, self.y, "nw"),  # Top-left
-                (self.x + self.width, self.y, "ne"),  # Top-right
-                (self.x, self.y + self.height, "sw"),  # Bottom-left
-                (self.x + self.width, self.y + self.height, "se"),  # Bottom-right
-            ]
-
-            for cx, cy, corner_type in corners:
-                handle = self.canvas.create_rectangle(
-                    cx - self.HANDLE_SIZE // 2, cy - self.HANDLE_SIZE // 2,
-                    cx + self.HANDLE_SIZE // 2, cy + self.HANDLE_SIZE // 2,
-                    fill=self.HANDLE_COLOR, outline="white",
-                    tags=f"handle_{self.name}_{corner_type}"
-                )
-                self.canvas_items.append(handle)
+        state = "normal" if self.selected else "hidden"
+        half = self.HANDLE_SIZE // 2
+
+        for cx, cy, corner_type in self.corners():
+            handle = self.handle_ids[corner_type]
+            self.canvas.coords(handle, cx - half, cy - half, cx + half, cy + half)
+            self.canvas.itemconfigure(handle, state=state)
+            if self.selected:
                 self.handles.append((handle, corner_type, cx, cy))
 
     def contains_point(self, px, py):
@@ -127,12 +235,14 @@ class BoundingBox:
                 return corner_type
         return None
 
-    def move_to(self, x, y):
-        """Move box to new position"""
-        self.x = x
-        self.y = y
+    def translate(self, dx, dy):
+        """Move box by an offset, shifting its canvas items in one call"""
+        self.x += dx
+        self.y += dy
+        self.canvas.move(self.group_tag, dx, dy)
+        self.handles = [(handle, corner_type, cx + dx, cy + dy)
+                        for handle, corner_type, cx, cy in self.handles]
         self.update_pdf_coords()
-        self.draw()
 
     def resize_corner(self, corner_type, new_x, new_y):
         """Resize box by dragging a corner"""
@@ -158,15 +268,19 @@ class BoundingBox:
 
     def update_pdf_coords(self):
         """Update PDF coordinates from display coordinates"""
-        self.pdf_x = int(self.x / self.scale)
-        self.pdf_y = int(self.y / self.scale)
-        self.pdf_width = int(self.width / self.scale)
-        self.pdf_height = int(self.height / self.scale)
+        inv_scale = self.inv_scale
+        self.pdf_x = int(self.x * inv_scale)
+        self.pdf_y = int(self.y * inv_scale)
+        self.pdf_width = int(self.width * inv_scale)
+        self.pdf_height = int(self.height * inv_scale)
 
     def set_selected(self, selected):
         """Set selection state"""
         self.selected = selected
         self.draw()
+        if selected:
+            # Bring the selected box above overlapping ones
+            self.canvas.tag_raise(self.group_tag)
 
     def get_pdf_box(self):
         """Return box in PDF coordinates"""
@@ -178,6 +292,81 @@ class BoundingBox:
         }
 
 
+class BoxHitIndex:
+    """Grid of canvas cells listing the boxes that overlap each cell
+
+    A click only tests the few boxes listed in its cell. Boxes are found in
+    creation order, so overlapping boxes resolve the same way as scanning
+    TemplateBuilder.boxes in order. A NumPy mask over an (N, 4) array of all
+    box rectangles is slower than this at template sizes: building the mask
+    costs more than the handful of contains_point calls per cell.
+    """
+
+    CELL_SIZE = 50
+
+    def __init__(self):
+        self.cells = {}  # (col, row) -> set of box names
+        self.box_cells = {}  # box name -> cells it is listed in
+        self.boxes = {}  # box name -> BoundingBox
+        self.order = {}  # box name -> creation sequence
+        self.next_order = 0
+
+    def cells_for(self, box):
+        """Return the cells covered by a box's display rectangle"""
+        size = self.CELL_SIZE
+        cols = range(box.x // size, (box.x + box.width) // size + 1)
+        rows = range(box.y // size, (box.y + box.height) // size + 1)
+        return [(col, row) for col in cols for row in rows]
+
+    def add(self, box):
+        """Add a new box, or refresh the cells of one that moved or resized"""
+        if box.name not in self.order:
+            self.order[box.name] = self.next_order
+            self.next_order += 1
+        else:
+            self.discard_cells(box.name)
+
+        self.boxes[box.name] = box
+        cells = self.cells_for(box)
+        self.box_cells[box.name] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(box.name)
+
+    def discard_cells(self, name):
+        """Unlist a box from every cell it covers"""
+        for cell in self.box_cells.pop(name, ()):
+            names = self.cells[cell]
+            names.discard(name)
+            if not names:
+                del self.cells[cell]
+
+    def remove(self, name):
+        """Remove a box from the index"""
+        self.discard_cells(name)
+        self.boxes.pop(name, None)
+        self.order.pop(name, None)
+
+    def clear(self):
+        """Remove every box"""
+        self.cells.clear()
+        self.box_cells.clear()
+        self.boxes.clear()
+        self.order.clear()
+        self.next_order = 0
+
+    def find(self, x, y):
+        """Return the first box (in creation order) containing the point, or None"""
+        size = self.CELL_SIZE
+        names = self.cells.get((x // size, y // size))
+        if not names:
+            return None
+        for name in sorted(names, key=self.order.__getitem__):
+            box = self.boxes[name]
+            if box.contains_point(x, y):
+                return box
+        return None
+
+
 class TemplateBuilder:
     def update_window_title(self):
         """Update window title to show current template"""
@@ -204,11 +393,10 @@ class TemplateBuilder:
         self.initial_boxes = self.load_initial_boxes()
 
         # Clear existing boxes
-        for box in self.boxes.values():
-            for item in box.canvas_items:
-                self.canvas.delete(item)
+        self.canvas.delete(BoundingBox.ITEM_TAG)
 
         self.boxes.clear()
+        self.hit_index.clear()
         self.box_listbox.delete(0, tk.END)
         self.selected_box = None
 
@@ -225,11 +413,10 @@ class TemplateBuilder:
 
         if template_path.exists():
             try:
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    template = json.load(f)
-                    boxes = template.get('fields', {})
-                    print(f"✓ Loaded {len(boxes)} boxes from {template_path}")
-                    return boxes
+                template = read_json(template_path)
+                boxes = template.get('fields', {})
+                print(f"✓ Loaded {len(boxes)} boxes from {template_path}")
+                return boxes
             except Exception as e:
                 print(f"⚠ Warning: Could not load {template_path}: {e}")
                 print(f"  Using fallback boxes instead")
@@ -239,45 +426,165 @@ class TemplateBuilder:
         # Fallback to hardcoded INITIAL_BOXES
         return INITIAL_BOXES.copy()
 
-    def load_current_pdf(self):
-        """Load and display the current PDF"""
+    def get_page_image(self, pdf_path, resolution):
+        """Return the first page of a PDF rendered at the given DPI
+
+        Rendered images are cached per (PDF, DPI), so navigating back to a PDF
+        or re-running test extraction does not rasterize the page again.
+        """
+        key = (pdf_path, resolution)
+        image = self.page_image_cache.get(key)
+        if image is not None:
+            self.page_image_cache.move_to_end(key)
+            return image
+
+        # Rendered on the render thread even when the caller waits for it, so
+        # renders never overlap (see render_executor). Queued prefetches are
+        # dropped first so the wait is at most one render already in flight;
+        # prefetch_neighbours() queues them again afterwards
+        for pending_path, future in self.pending_renders.items():
+            if pending_path != pdf_path:
+                future.cancel()
+        image = self.render_executor.submit(render_first_page, pdf_path, resolution).result()
+        self.cache_page_image(key, image)
+        self.prefetch_neighbours()
+        return image
+
+    def cache_page_image(self, key, image):
+        """Store a rendered page under (pdf_path, dpi), dropping the oldest if full"""
+        self.page_image_cache[key] = image
+        if len(self.page_image_cache) > PAGE_IMAGE_CACHE_SIZE:
+            self.page_image_cache.popitem(last=False)
+
+    def load_current_pdf(self, background=False):
+        """Load and display the current PDF
+
+        Args:
+            background: if the page is not cached yet, render it on the render
+                thread and show it when ready instead of blocking the UI
+        """
         self.pdf_path = str(self.pdf_files[self.current_pdf_index])
         print(f"Loading PDF {self.current_pdf_index + 1}/{len(self.pdf_files)}: {self.pdf_files[self.current_pdf_index].name}")
 
-        with pdfplumber.open(self.pdf_path) as pdf:
-            page = pdf.pages[0]
-            # Convert to image
-            pil_image = page.to_image(resolution=150).original
-            self.pdf_image = pil_image
+        if (background and self.pdf_path not in self.photo_image_cache
+                and (self.pdf_path, self.display_dpi) not in self.page_image_cache):
+            self.update_pdf_counter(loading=True)
+            self.render_in_background(self.pdf_path)
+            self.prefetch_neighbours()
+            return
 
-        # Resize PDF image for display
-        display_size = (self.canvas_width, self.canvas_height)
-        self.display_image = self.pdf_image.resize(display_size, Image.Resampling.LANCZOS)
-        self.photo_image = ImageTk.PhotoImage(self.display_image)
+        self.show_page_image()
+        self.update_pdf_counter()
+        self.prefetch_neighbours()
+
+    def show_page_image(self):
+        """Display the current PDF's page on the canvas"""
+        self.shown_pdf_index = self.current_pdf_index
+        # Converting to a PhotoImage copies every pixel into Tk, so keep the
+        # converted page per PDF; the cache also holds the Tk references
+        cached = self.photo_image_cache.get(self.pdf_path)
+        if cached is not None:
+            self.photo_image_cache.move_to_end(self.pdf_path)
+            self.pdf_image, self.photo_image = cached
+        else:
+            # Rendered straight at display size, so no resize is needed
+            self.pdf_image = self.get_page_image(self.pdf_path, self.display_dpi)
+            self.photo_image = ImageTk.PhotoImage(self.pdf_image)
+            self.photo_image_cache[self.pdf_path] = (self.pdf_image, self.photo_image)
+            if len(self.photo_image_cache) > PAGE_IMAGE_CACHE_SIZE:
+                self.photo_image_cache.popitem(last=False)
+        self.display_image = self.pdf_image
 
         # Update canvas image if canvas exists
         if hasattr(self, 'canvas'):
+            # Only the background changes; box items stay where they are
             if self.canvas_image_id:
-                self.canvas.delete(self.canvas_image_id)
-            self.canvas_image_id = self.canvas.create_image(0, 0, image=self.photo_image, anchor="nw", tags="pdf_image")
-            self.canvas.tag_lower("pdf_image")  # Send to back
+                self.canvas.itemconfigure(self.canvas_image_id, image=self.photo_image)
+            else:
+                self.canvas_image_id = self.canvas.create_image(0, 0, image=self.photo_image, anchor="nw", tags="pdf_image")
+                self.canvas.tag_lower("pdf_image")  # Send to back
+
+    def update_pdf_counter(self, loading=False):
+        """Show the current PDF's position and name in the counter label, if any"""
+        if hasattr(self, 'pdf_counter_label'):
+            text = f"PDF {self.current_pdf_index + 1} of {len(self.pdf_files)}: {self.pdf_files[self.current_pdf_index].name}"
+            if loading:
+                text += " (loading...)"
+            self.pdf_counter_label.config(text=text)
+
+    def render_in_background(self, pdf_path):
+        """Rasterize a PDF's page at display size on the render thread
+
+        Tk may only be touched from the main thread, so the finished image is
+        picked up by poll_render() via root.after rather than a done-callback.
+        """
+        pending = self.pending_renders.get(pdf_path)
+        if pending is not None and not pending.cancelled():
+            return
+        future = self.render_executor.submit(render_first_page, pdf_path, self.display_dpi)
+        self.pending_renders[pdf_path] = future
+        self.root.after(RENDER_POLL_MS, self.poll_render, pdf_path, future)
+
+    def poll_render(self, pdf_path, future):
+        """Cache a finished background render and show it if its PDF is current"""
+        if not future.done():
+            self.root.after(RENDER_POLL_MS, self.poll_render, pdf_path, future)
+            return
 
-            # Redraw all boxes
-            for box in self.boxes.values():
-                box.draw()
+        if self.pending_renders.get(pdf_path) is future:
+            del self.pending_renders[pdf_path]
+        if future.cancelled():
+            return
+        is_current = pdf_path == self.pdf_path
+        try:
+            image = future.result()
+        except Exception as e:
+            print(f"✗ Failed to render {pdf_path}: {e}")
+            self.failed_renders.add(pdf_path)
+            if is_current:
+                # Go back to the PDF still on the canvas, so testing runs
+                # against the page the user is looking at
+                self.current_pdf_index = self.shown_pdf_index
+                self.pdf_path = str(self.pdf_files[self.current_pdf_index])
+                self.update_pdf_counter()
+                messagebox.showerror("Render Error", f"Failed to render {pdf_path}:\n{e}")
+            return
 
-            # Update PDF counter label if it exists
-            if hasattr(self, 'pdf_counter_label'):
-                self.pdf_counter_label.config(
-                    text=f"PDF {self.current_pdf_index + 1} of {len(self.pdf_files)}: {self.pdf_files[self.current_pdf_index].name}"
-                )
+        self.cache_page_image((pdf_path, self.display_dpi), image)
+        if is_current:
+            self.show_page_image()
+            self.update_pdf_counter()
+            self.prefetch_neighbours()
+
+    def prefetch_neighbours(self):
+        """Render the previous and next PDFs in the background
+
+        Users mostly step through a folder one PDF at a time, so this makes the
+        next Previous/Next click a cache hit. Queued renders for PDFs that are
+        no longer current or adjacent are cancelled first.
+        """
+        # Current PDF first, then the more likely next step
+        wanted = [
+            str(self.pdf_files[i])
+            for i in (self.current_pdf_index, self.current_pdf_index + 1, self.current_pdf_index - 1)
+            if 0 <= i < len(self.pdf_files)
+        ]
+        for pdf_path, future in self.pending_renders.items():
+            if pdf_path not in wanted:
+                future.cancel()  # No-op if it is already rendering
+
+        for pdf_path in wanted:
+            if (pdf_path not in self.photo_image_cache
+                    and pdf_path not in self.failed_renders
+                    and (pdf_path, self.display_dpi) not in self.page_image_cache):
+                self.render_in_background(pdf_path)
 
     def navigate_pdf(self, direction):
         """Navigate to previous/next PDF"""
         new_index = self.current_pdf_index + direction
         if 0 <= new_index < len(self.pdf_files):
             self.current_pdf_index = new_index
-            self.load_current_pdf()
+            self.load_current_pdf(background=True)
 
     def __init__(self, pdf_source, output_json="template.json"):
         from pathlib import Path
@@ -307,8 +614,13 @@ class TemplateBuilder:
         self.pdf_path = str(self.pdf_files[self.current_pdf_index])
 
         self.boxes = {}
+        self.hit_index = BoxHitIndex()
         self.selected_box = None
         self.drag_data = {"box": None, "handle": None, "x": 0, "y": 0}
+        # Motion events are coalesced: only the latest pointer position is
+        # applied, once per trip through the Tk idle loop
+        self.pending_drag = None
+        self.drag_flush_scheduled = False
 
         # Create main window FIRST
         self.root = tk.Tk()
@@ -328,13 +640,21 @@ class TemplateBuilder:
         self.display_image = None
         self.photo_image = None
         self.canvas_image_id = None
+        self.page_image_cache = OrderedDict()  # (pdf_path, dpi) -> PIL image
+        self.photo_image_cache = OrderedDict()  # pdf_path -> (PIL image, PhotoImage) at display size
+        # One render thread keeps navigation responsive. Neither PyMuPDF nor
+        # PDFium (behind pdfplumber's to_image) may be called from two threads
+        # at once, so every call into them is submitted here, including the
+        # ones the UI waits on, and they run one at a time
+        self.render_executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_renders = {}  # pdf_path -> Future of its display-size render
+        self.failed_renders = set()  # PDFs not to prefetch again (navigating still retries)
+        self.shown_pdf_index = None  # PDF whose page is on the canvas (lags while loading)
 
         # Load first PDF to get dimensions
         print(f"Loading initial PDF...")
-        with pdfplumber.open(self.pdf_path) as pdf:
-            page = pdf.pages[0]
-            self.pdf_width = page.width
-            self.pdf_height = page.height
+        self.pdf_width, self.pdf_height = self.render_executor.submit(
+            first_page_size, self.pdf_path).result()
 
         # Calculate scale to fit screen
         max_width = 1000
@@ -345,6 +665,7 @@ class TemplateBuilder:
 
         self.canvas_width = int(self.pdf_width * self.scale)
         self.canvas_height = int(self.pdf_height * self.scale)
+        self.display_dpi = 72 * self.scale  # PDF points are 1/72 inch
 
         # Setup UI
         self.setup_ui()
@@ -378,8 +699,14 @@ class TemplateBuilder:
 
         v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
         h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
-
-        self.canvas.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.canvas_v_scrollbar = v_scrollbar
+        self.canvas_h_scrollbar = h_scrollbar
+
+        # The canvas reports every view change through its scroll commands, so
+        # the scroll offset is tracked there instead of queried per mouse event
+        self.scroll_x = 0
+        self.scroll_y = 0
+        self.canvas.configure(yscrollcommand=self.on_canvas_yscroll, xscrollcommand=self.on_canvas_xscroll)
         self.canvas.config(scrollregion=(0, 0, self.canvas_width, self.canvas_height))
 
         # Pack scrollbars and canvas
@@ -523,7 +850,9 @@ class TemplateBuilder:
                 self.scale
             )
             self.boxes[name] = box
-            self.box_listbox.insert(tk.END, name)
+            self.hit_index.add(box)
+        # One listbox call for all rows
+        self.box_listbox.insert(tk.END, *self.initial_boxes)
 
     def on_listbox_select(self, event):
         """Handle listbox selection"""
@@ -541,21 +870,21 @@ class TemplateBuilder:
         if box:
             box.set_selected(True)
 
-    def get_canvas_coords(self, event_x, event_y):
-        """Convert viewport coordinates to canvas coordinates (accounting for scroll)"""
-        # Get scroll position (returns fraction of total scrollable area)
-        x_view = self.canvas.xview()
-        y_view = self.canvas.yview()
-
-        # Calculate scroll offset in pixels
-        x_offset = int(x_view[0] * self.canvas_width)
-        y_offset = int(y_view[0] * self.canvas_height)
+    def on_canvas_xscroll(self, first, last):
+        """Record the horizontal scroll offset and update the scrollbar"""
+        # first is the fraction of the scrollable area left of the view
+        self.scroll_x = int(float(first) * self.canvas_width)
+        self.canvas_h_scrollbar.set(first, last)
 
-        # Add offset to event coordinates
-        canvas_x = event_x + x_offset
-        canvas_y = event_y + y_offset
+    def on_canvas_yscroll(self, first, last):
+        """Record the vertical scroll offset and update the scrollbar"""
+        self.scroll_y = int(float(first) * self.canvas_height)
+        self.canvas_v_scrollbar.set(first, last)
 
-        return canvas_x, canvas_y
+    def get_canvas_coords(self, event_x, event_y):
+        """Convert viewport coordinates to canvas coordinates (accounting for scroll)"""
+        # Add the scroll offset in pixels, kept current by the scroll commands
+        return event_x + self.scroll_x, event_y + self.scroll_y
 
     def on_mouse_down(self, event):
         """Handle mouse button press"""
@@ -569,11 +898,11 @@ class TemplateBuilder:
                 return
 
         # Check if clicking on any box
-        for name, box in self.boxes.items():
-            if box.contains_point(x, y):
-                self.select_box(box)
-                self.drag_data = {"box": box, "handle": None, "x": x, "y": y}
-                return
+        box = self.hit_index.find(x, y)
+        if box:
+            self.select_box(box)
+            self.drag_data = {"box": box, "handle": None, "x": x, "y": y}
+            return
 
         # Clicked on empty space
         self.select_box(None)
@@ -583,7 +912,19 @@ class TemplateBuilder:
         if not self.drag_data["box"]:
             return
 
-        x, y = self.get_canvas_coords(event.x, event.y)
+        self.pending_drag = (event.x, event.y)
+        if not self.drag_flush_scheduled:
+            self.drag_flush_scheduled = True
+            self.root.after_idle(self.flush_drag)
+
+    def flush_drag(self):
+        """Apply the latest pending drag position to the dragged box"""
+        self.drag_flush_scheduled = False
+        if self.pending_drag is None or not self.drag_data["box"]:
+            return
+
+        x, y = self.get_canvas_coords(*self.pending_drag)
+        self.pending_drag = None
         box = self.drag_data["box"]
         handle = self.drag_data["handle"]
 
@@ -594,36 +935,40 @@ class TemplateBuilder:
             # Move box
             dx = x - self.drag_data["x"]
             dy = y - self.drag_data["y"]
-            box.move_to(box.x + dx, box.y + dy)
+            box.translate(dx, dy)
             self.drag_data["x"] = x
             self.drag_data["y"] = y
 
     def on_mouse_up(self, event):
         """Handle mouse button release"""
+        self.flush_drag()
+        # Re-index the dragged box once, at its final position
+        if self.drag_data["box"]:
+            self.hit_index.add(self.drag_data["box"])
         self.drag_data = {"box": None, "handle": None, "x": 0, "y": 0}
 
     def on_right_click(self, event):
         """Handle right-click to delete box"""
         x, y = self.get_canvas_coords(event.x, event.y)
 
-        for name, box in list(self.boxes.items()):
-            if box.contains_point(x, y):
-                if messagebox.askyesno("Delete Box", f"Delete '{name}' box?"):
-                    # Remove from canvas
-                    for item in box.canvas_items:
-                        self.canvas.delete(item)
+        box = self.hit_index.find(x, y)
+        if box:
+            name = box.name
+            if messagebox.askyesno("Delete Box", f"Delete '{name}' box?"):
+                # Remove from canvas
+                for item in box.canvas_items:
+                    self.canvas.delete(item)
 
-                    # Remove from list
-                    del self.boxes[name]
+                # Remove from list; listbox rows follow self.boxes order
+                row = list(self.boxes).index(name)
+                del self.boxes[name]
+                self.hit_index.remove(name)
 
-                    # Update listbox
-                    self.box_listbox.delete(0, tk.END)
-                    for box_name in self.boxes.keys():
-                        self.box_listbox.insert(tk.END, box_name)
+                # Update listbox
+                self.box_listbox.delete(row)
 
-                    if self.selected_box == box:
-                        self.selected_box = None
-                break
+                if self.selected_box == box:
+                    self.selected_box = None
 
     def save_template(self):
         """Save template to JSON"""
@@ -640,14 +985,17 @@ class TemplateBuilder:
         }
 
         current_template = self.get_current_template_file()
-        with open(current_template, 'w', encoding='utf-8') as f:
-            json.dump(template, f, indent=2, ensure_ascii=False)
+        write_json(template, current_template)
 
         messagebox.showinfo("Success", f"✓ Template saved to {current_template}\n\n{len(fields)} boxes saved.")
         print(f"\n✓ Saved {len(fields)} boxes to {current_template}")
 
     def test_extraction(self):
         """Test extraction with current boxes and display results"""
+        if self.shown_pdf_index != self.current_pdf_index:
+            messagebox.showinfo("Loading", "The PDF page is still loading, try again in a moment.")
+            return
+
         try:
             # Update results text
             self.results_text.config(state=tk.NORMAL)
@@ -664,8 +1012,9 @@ class TemplateBuilder:
             # Import extraction functionality
             from pathlib import Path
             import sys
+            import pdfplumber
             sys.path.insert(0, str(Path(__file__).parent))
-            from extract_str import STRExtractor
+            from extract_str import STRExtractor, WordIndex
 
             # Create temporary template
             temp_template = {
@@ -676,23 +1025,21 @@ class TemplateBuilder:
                 "fields": fields
             }
 
-            # Save to temp file
-            temp_json = "_temp_template.json"
-            with open(temp_json, 'w', encoding='utf-8') as f:
-                json.dump(temp_template, f, indent=2, ensure_ascii=False)
-
             # Run extraction using new bounding box-based method
-            extractor = STRExtractor(temp_json)
+            extractor = STRExtractor.from_dict(temp_template)
 
             with pdfplumber.open(self.pdf_path) as pdf:
                 page = pdf.pages[0]
+                # Build the word index once; both stages below query it
+                index = WordIndex(page.extract_words())
+                extract_box = extractor.make_box_extractor(index)
 
                 # STAGE 1: Auto-detect template based on status_perkahwinan
                 print("\n  === STAGE 1: Auto-detecting template ===")
                 status_perkahwinan = ""
                 if 'status_perkahwinan' in fields:
                     status_box = fields['status_perkahwinan']
-                    status_perkahwinan = extractor.extract_text_from_box(page, status_box).upper()
+                    status_perkahwinan = extract_box(status_box).upper()
                     print(f"  Status Perkahwinan: {status_perkahwinan}")
 
                 # Determine which template to use
@@ -703,73 +1050,31 @@ class TemplateBuilder:
                     template_to_use = "template_without_pasangan.json"
                     print(f"  → Auto-selected: WITHOUT PASANGAN template")
 
-                # Reload with correct template if different
-                if template_to_use != Path(temp_json).name:
-                    print(f"  Reloading fields from: {template_to_use}")
-                    extractor.load_template(template_to_use)
-                    # Update fields dict with the new template
-                    fields = extractor.fields.copy()
+                # Reload with the stage-2 template (the in-memory one never matches)
+                print(f"  Reloading fields from: {template_to_use}")
+                extractor.load_template(template_to_use)
 
                 # STAGE 2: Detect section offsets using header anchors
                 print("\n  === STAGE 2: Detecting Section Offsets ===")
-                pemohon_offset = extractor.detect_section_offset(page, 'maklumat_pemohon_header')
-                pasangan_offset = extractor.detect_section_offset(page, 'maklumat_pasangan_header')
-                anak_offset = extractor.detect_section_offset(page, 'maklumat_anak_header')
-                waris_offset = extractor.detect_section_offset(page, 'maklumat_waris_header')
+                section_offsets = extractor.detect_all_section_offsets(index)
 
-                # Extract all fields from bounding boxes with section-specific offsets
+                # Extract all fields with the extractor's own field plan, so the
+                # preview matches what extract_str produces for this PDF
                 print("\n  === Extracting Fields ===")
-                extracted_data = {}
-                pasangan_fields = {}
-                waris_fields = {}
-
-                for field_name, box in fields.items():
-                    # Skip header fields
-                    if field_name.endswith('_header'):
-                        continue
-
-                    # Determine section-specific offset
-                    if field_name.startswith('waris_'):
-                        offset = waris_offset
-                    elif field_name.startswith('pasangan_'):
-                        offset = pasangan_offset
-                    else:
-                        offset = pemohon_offset
-
-                    # Determine field-specific tolerance (jantina needs tighter tolerance)
-                    tolerance = 3 if field_name == 'jantina' else 5
-
-                    # Extract with section offset and field-specific tolerance
-                    text = extractor.extract_text_from_box(page, box, y_offset=offset, tolerance=tolerance)
-
-                    # Group fields by prefix
-                    if field_name.startswith('pasangan_'):
-                        clean_name = field_name.replace('pasangan_', '')
-                        pasangan_fields[clean_name] = text
-                    elif field_name.startswith('waris_'):
-                        clean_name = field_name.replace('waris_', '')
-                        waris_fields[clean_name] = text
-                    else:
-                        extracted_data[field_name] = text
-
-                # Extract MAKLUMAT ANAK table (table detection is position-independent)
-                children = extractor.extract_anak_table(page)
+                extracted_data, pasangan_fields, waris_fields = extractor.extract_planned_fields(
+                    extract_box, section_offsets, page.height)
+
+                # Extract MAKLUMAT ANAK table (searched below the detected ANAK header)
+                children = extractor.extract_anak_table(page, index, y_offset=section_offsets['anak'])
                 extracted_data['anak'] = children
 
                 # Add grouped sections
                 extracted_data['pasangan'] = pasangan_fields
                 extracted_data['waris'] = waris_fields
 
-                # Show visualization with extraction boxes
-                offsets = {
-                    'pemohon': pemohon_offset,
-                    'pasangan': pasangan_offset,
-                    'waris': waris_offset
-                }
-                self.show_extraction_visualization(page, fields, offsets)
-
-            # Clean up temp file
-            Path(temp_json).unlink(missing_ok=True)
+                # Show visualization with extraction boxes, placed from the same
+                # field plan and offsets the extraction used
+                self.show_extraction_visualization(extractor.field_plan, section_offsets)
 
             # Format and display results
             results_json = json.dumps(extracted_data, indent=2, ensure_ascii=False)
@@ -791,11 +1096,16 @@ class TemplateBuilder:
             import traceback
             traceback.print_exc()
 
-    def show_extraction_visualization(self, page, fields, offsets):
-        """Show annotated PDF with extraction bounding boxes in a new window"""
+    def show_extraction_visualization(self, field_plan, offsets):
+        """Show annotated PDF with extraction bounding boxes in a new window
+
+        Args:
+            field_plan: the extractor's field plan (see STRExtractor.build_field_plan)
+            offsets: section Y-offsets from detect_all_section_offsets()
+        """
         try:
-            # Convert PDF page to PIL Image
-            pil_image = page.to_image(resolution=150).original
+            # Draw on a copy of the cached 150 DPI page image
+            pil_image = self.get_page_image(self.pdf_path, 150).copy()
             draw = ImageDraw.Draw(pil_image)
 
             # Try to use a system font, fall back to default if not available
@@ -804,23 +1114,10 @@ class TemplateBuilder:
             except:
                 font = ImageFont.load_default()
 
-            # Draw bounding boxes for each field
-            pemohon_offset = offsets['pemohon']
-            pasangan_offset = offsets['pasangan']
-            waris_offset = offsets['waris']
-
-            for field_name, box in fields.items():
-                # Skip header fields
-                if field_name.endswith('_header'):
-                    continue
-
-                # Determine section-specific offset
-                if field_name.startswith('waris_'):
-                    y_offset = waris_offset
-                elif field_name.startswith('pasangan_'):
-                    y_offset = pasangan_offset
-                else:
-                    y_offset = pemohon_offset
+            # Draw bounding boxes for each field (header fields are not in the plan)
+            for field_name, box, section, *_ in field_plan:
+                # Section-specific offset, as used for extraction
+                y_offset = offsets[section]
 
                 # Calculate adjusted coordinates (PDF coordinates to image coordinates)
                 # pdfplumber's to_image uses resolution scaling
@@ -872,13 +1169,20 @@ class TemplateBuilder:
 
     def run(self):
         """Run the application"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.render_executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
+    import logging
     import sys
     from pathlib import Path
 
+    # Show the extractor's progress messages during test extraction
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     # Default to ./pdf folder if it exists, otherwise use a single PDF
     default_pdf_folder = Path("./pdf")
     default_pdf_file = "STR_000121131278.pdf"